@@ -0,0 +1,197 @@
+# Imports
+import threading
+import numpy as np
+from export import ZERO_ADDRESS, iter_enrollment_records # Custom module to stream enrollment records
+from rpc import iter_log_chunks # Custom module for batched JSON-RPC calls
+
+# Running aggregates for a single course
+class CourseStats:
+    __slots__ = ('course_id', 'enrollments', 'attempted', 'passed', 'completed', 'completion_seconds', 'revenue')
+
+    def __init__(self, course_id):
+        self.course_id = course_id
+        self.enrollments = 0
+        self.attempted = 0 # Students with a recorded exam result
+        self.passed = 0
+        self.completed = 0
+        self.completion_seconds = 0 # Total time from enrollment to completion
+        self.revenue = 0 # Total fees in wei
+
+    # Share of attempted exams that were passed
+    @property
+    def pass_rate(self):
+        return self.passed / self.attempted if self.attempted else 0.0
+
+    # Average number of days from enrollment to completion
+    @property
+    def average_days_to_completion(self):
+        return self.completion_seconds / self.completed / 86400 if self.completed else None
+
+# Per-course analytics, updated incrementally as enrollments, exam results and certificates appear
+class Analytics:
+    __slots__ = ('stats', 'enrollment_dates', 'exam_results', 'completion_dates', 'synced_block', 'is_built', 'is_building', 'build_error', '_lock')
+
+    def __init__(self):
+        self.stats = {} # course ID -> CourseStats
+        # Facts already counted, keyed by (course ID, student), so repeated updates are not double counted
+        self.enrollment_dates = {}
+        self.exam_results = {}
+        self.completion_dates = {}
+        self.synced_block = -1 # Last block whose events are reflected in the aggregates
+        self.is_built = False
+        self.is_building = False
+        self.build_error = None # Message from the last failed background build
+        self._lock = threading.RLock() # Streamlit sessions run on separate threads
+
+    # Retrieve the aggregates for a course, creating them on first use
+    def course_stats(self, course_id):
+        if course_id not in self.stats:
+            self.stats[course_id] = CourseStats(course_id)
+        return self.stats[course_id]
+
+    # Count an enrollment's fee, and the enrollment itself if the student is new to the course
+    # The contract charges the fee again for a repeated enrollment, so revenue is counted per Enrolled event
+    def record_enrollment(self, course_id, student, fee, enrollment_date):
+        with self._lock:
+            if not self.is_built:
+                return
+            stats = self.course_stats(course_id)
+            stats.revenue += fee
+            key = (course_id, student)
+            if key in self.enrollment_dates:
+                return
+            self.enrollment_dates[key] = enrollment_date
+            stats.enrollments += 1
+
+    # Count an exam result, replacing any earlier result for the same student
+    def record_exam_result(self, course_id, student, is_passed):
+        with self._lock:
+            if not self.is_built:
+                return
+            key = (course_id, student)
+            stats = self.course_stats(course_id)
+            if key in self.exam_results:
+                stats.passed -= self.exam_results[key]
+            else:
+                stats.attempted += 1
+            self.exam_results[key] = is_passed
+            stats.passed += is_passed
+
+    # Count a completion and the time it took since enrollment
+    def record_completion(self, course_id, student, completion_date):
+        with self._lock:
+            key = (course_id, student)
+            if not self.is_built or key in self.completion_dates or key not in self.enrollment_dates:
+                return
+            self.completion_dates[key] = completion_date
+            stats = self.course_stats(course_id)
+            stats.completed += 1
+            stats.completion_seconds += completion_date - self.enrollment_dates[key]
+
+    # Recompute every aggregate from the chain, using columnar arrays for the per-course totals
+    def rebuild(self, contract, catalog):
+        # Events from later blocks are applied by sync; replaying one already read here does not double count it
+        synced_block = contract.web3.eth.blockNumber
+        catalog.sync_courses(contract) # Enrollments may be in courses created since the catalog's last sync
+
+        # Revenue is counted per Enrolled event up to the synced block, as repeated enrollments are charged again
+        fee_course_ids = [log.args.courseId for _, logs in iter_log_chunks([contract.events.Enrolled], catalog.start_block, synced_block) for log in logs]
+
+        course_ids, students, enrollment_dates, attempted, passed, completion_dates = [], [], [], [], [], []
+        for course, enrollment, exam_result, completion_date in iter_enrollment_records(contract, catalog):
+            course_ids.append(course.id)
+            students.append(enrollment.student)
+            enrollment_dates.append(enrollment.enrollment_date)
+            attempted.append(exam_result[1] != ZERO_ADDRESS) # The student is only set once a result is recorded
+            passed.append(exam_result[2])
+            completion_dates.append(completion_date)
+
+        # Every course read above is in this snapshot, even if more are added meanwhile
+        courses = list(catalog.courses)
+        course_count = len(courses)
+        course_ids = np.array(course_ids, dtype=np.int64)
+        enrollment_dates = np.array(enrollment_dates, dtype=np.int64)
+        attempted = np.array(attempted, dtype=bool)
+        passed = np.array(passed, dtype=bool)
+        completion_dates = np.array(completion_dates, dtype=np.int64)
+        completed = completion_dates != 0
+
+        enrollments = np.bincount(course_ids, minlength=course_count)
+        attempted_counts = np.bincount(course_ids[attempted], minlength=course_count)
+        passed_counts = np.bincount(course_ids[attempted & passed], minlength=course_count)
+        completed_counts = np.bincount(course_ids[completed], minlength=course_count)
+        completion_seconds = np.bincount(course_ids[completed], weights=completion_dates[completed] - enrollment_dates[completed], minlength=course_count)
+        fee_counts = np.bincount(np.array(fee_course_ids, dtype=np.int64), minlength=course_count)
+
+        with self._lock:
+            self.stats = {}
+            for course in courses:
+                stats = self.course_stats(course.id)
+                stats.enrollments = int(enrollments[course.id])
+                stats.attempted = int(attempted_counts[course.id])
+                stats.passed = int(passed_counts[course.id])
+                stats.completed = int(completed_counts[course.id])
+                stats.completion_seconds = int(completion_seconds[course.id])
+                stats.revenue = int(fee_counts[course.id]) * course.fee # Fee is fixed per course, kept as an int to avoid overflow
+            keys = list(zip(course_ids.tolist(), students))
+            self.enrollment_dates = dict(zip(keys, enrollment_dates.tolist()))
+            self.exam_results = {key: bool(is_passed) for key, is_attempted, is_passed in zip(keys, attempted, passed) if is_attempted}
+            self.completion_dates = {key: int(date) for key, date in zip(keys, completion_dates) if date}
+            self.synced_block = synced_block
+            self.is_built = True
+        return self
+
+    # Start a rebuild on a background thread, unless one is already running
+    def start_rebuild(self, contract, catalog):
+        with self._lock:
+            if self.is_building:
+                return
+            self.is_building = True
+            self.build_error = None
+        threading.Thread(target=self._rebuild_in_background, args=(contract, catalog), daemon=True).start()
+
+    def _rebuild_in_background(self, contract, catalog):
+        try:
+            self.rebuild(contract, catalog)
+        except Exception as e:
+            self.build_error = str(e)
+        finally:
+            self.is_building = False
+
+    # Apply the enrollments, exam results and certificates emitted on chain since the last sync or rebuild
+    # Dates are the timestamps of the blocks the events were mined in, matching the dates the contract stores
+    def sync(self, contract, catalog):
+        with self._lock:
+            if not self.is_built:
+                return self
+            events = contract.events
+            block_timestamps = {}
+            latest_block = contract.web3.eth.blockNumber
+            catalog.sync_courses(contract) # Fees of courses created up to the latest block
+            for end_block, logs in iter_log_chunks([events.Enrolled, events.ExamResultRecorded, events.CertificateIssued], self.synced_block + 1, latest_block):
+                # Read every timestamp first, so a failed read never leaves a chunk half applied (fees would be counted twice on retry)
+                for block_number in {log.blockNumber for log in logs} - block_timestamps.keys():
+                    block_timestamps[block_number] = contract.web3.eth.getBlock(block_number).timestamp
+                for log in logs:
+                    course_id, student, timestamp = log.args.courseId, log.args.student, block_timestamps[log.blockNumber]
+                    if log.event == 'Enrolled':
+                        self.record_enrollment(course_id, student, catalog.course(course_id).fee, timestamp)
+                    elif log.event == 'ExamResultRecorded':
+                        self.record_exam_result(course_id, student, log.args.isPassed)
+                    else:
+                        self.record_completion(course_id, student, timestamp)
+                # Record progress per chunk so a failed query resumes where it stopped
+                self.synced_block = end_block
+        return self
+
+    # Retrieve the aggregates for every course in course ID order
+    def summary(self, catalog):
+        with self._lock:
+            return [(course, self.course_stats(course.id)) for course in catalog.courses]
+
+# Shared analytics, kept across Streamlit reruns and sessions
+_analytics = Analytics()
+
+# Function to retrieve the shared analytics (events are only applied once the first rebuild has finished)
+def get_analytics():
+    return _analytics
@@ -0,0 +1,133 @@
+# Compares the previous string-based LearningPlatform storage layout with the bytes32 layout:
+# gas for the storage, calldata and logs each write pays for, and the size and decode time of each read.
+# Run with `python benchmark_storage.py` from the src directory; no node or deployed contract is needed.
+
+# Imports
+import timeit
+try:
+    from eth_abi import decode, encode # eth-abi >= 4
+except ImportError:
+    from eth_abi import decode_abi as decode, encode_abi as encode # eth-abi 2.x, as pinned by web3 5
+from ipfs_hash import cid_to_bytes32 # Custom module to convert IPFS hashes
+
+# Sample values, using the repository's own IPFS hashes and course names
+TITLE = "Blockchain & Web3"
+STUDENT_NAME = "Satoshi Nakamoto"
+ADDRESS = '0x' + '5a' * 20
+IPFS_HASH = 'QmX7vXcFZgoTe8pwEqChUT8A641Gu5CfGcHNu6LKWgp45Z'
+METADATA_IPFS_HASH = 'QmazrLqVKC1MAwyMjnrvL5YuRL8h4U5H1ZRhc4SpSyP85w'
+FEE = 10 ** 18
+TIMESTAMP = 1700000000
+
+# Gas schedule (Berlin/London)
+GAS_NEW_SLOT = 22100 # Cold SSTORE from zero to non-zero
+GAS_CALLDATA_ZERO_BYTE = 4
+GAS_CALLDATA_NONZERO_BYTE = 16
+GAS_LOG = 375
+GAS_LOG_TOPIC = 375
+GAS_LOG_DATA_BYTE = 8
+
+# Number of decodes timed per read
+DECODE_RUNS = 20000
+
+# Function to count the storage slots a string occupies
+def string_slots(value):
+    length = len(value.encode())
+    return 1 if length < 32 else 1 + (length + 31) // 32
+
+# Function to price the calldata for a call with the given argument types and values
+def calldata_gas(types, values):
+    selector_gas = 4 * GAS_CALLDATA_NONZERO_BYTE
+    return selector_gas + sum(GAS_CALLDATA_ZERO_BYTE if byte == 0 else GAS_CALLDATA_NONZERO_BYTE for byte in encode(types, values))
+
+# Function to estimate the gas that differs between the layouts for each write
+def write_gas():
+    digest = cid_to_bytes32(IPFS_HASH)
+    metadata_digest = cid_to_bytes32(METADATA_IPFS_HASH)
+    name_log = GAS_LOG + 3 * GAS_LOG_TOPIC + GAS_LOG_DATA_BYTE * len(encode(['string'], [STUDENT_NAME]))
+    # CertificateIssued and ExamResultRecorded: signature, courseId and student topics, one word of data
+    certificate_log = exam_result_log = GAS_LOG + 3 * GAS_LOG_TOPIC + GAS_LOG_DATA_BYTE * 32
+    return {
+        'createCourse': (
+            # id, title, instructor, ipfsHash, examTitle, certificateIpfsHash, isActive, fee
+            GAS_NEW_SLOT * (1 + string_slots(TITLE) + 1 + string_slots(IPFS_HASH) + string_slots(TITLE) + string_slots(IPFS_HASH) + 1 + 1)
+            + calldata_gas(['string', 'address', 'string', 'string', 'string', 'uint256'], [TITLE, ADDRESS, IPFS_HASH, TITLE, IPFS_HASH, FEE]),
+            # id, title, instructor + isActive (packed), ipfsHash, certificateIpfsHash, fee
+            GAS_NEW_SLOT * (1 + string_slots(TITLE) + 1 + 1 + 1 + 1)
+            + calldata_gas(['string', 'address', 'bytes32', 'bytes32', 'uint256'], [TITLE, ADDRESS, digest, digest, FEE]),
+        ),
+        'enrollInCourse': (
+            # courseId, student, studentName, isCompleted, enrollmentDate (isCompleted is false, so never written)
+            GAS_NEW_SLOT * (1 + 1 + string_slots(STUDENT_NAME) + 1)
+            + calldata_gas(['uint256', 'string'], [1, STUDENT_NAME]),
+            # courseId, student + isCompleted (packed), enrollmentDate, plus the Enrolled event
+            GAS_NEW_SLOT * (1 + 1 + 1) + name_log
+            + calldata_gas(['uint256', 'string'], [1, STUDENT_NAME]),
+        ),
+        'markCompletionAndIssueCertificate': (
+            # certificateIpfsHash, metadataIpfsHash, completionDate
+            GAS_NEW_SLOT * (string_slots(IPFS_HASH) + string_slots(METADATA_IPFS_HASH) + 1)
+            + calldata_gas(['uint256', 'address', 'string', 'string'], [1, ADDRESS, STUDENT_NAME, METADATA_IPFS_HASH]),
+            # Same slots, plus the CertificateIssued event
+            GAS_NEW_SLOT * (1 + 1 + 1) + certificate_log
+            + calldata_gas(['uint256', 'address', 'bytes32'], [1, ADDRESS, metadata_digest]),
+        ),
+        'recordExamResult': (
+            # courseId, student + isPassed (packed), passedTimestamp, for a passed exam
+            GAS_NEW_SLOT * (1 + 1 + 1)
+            + calldata_gas(['uint256', 'bool'], [1, True]),
+            # Same slots, plus the ExamResultRecorded event
+            GAS_NEW_SLOT * (1 + 1 + 1) + exam_result_log
+            + calldata_gas(['uint256', 'bool'], [1, True]),
+        ),
+    }
+
+# Function to build the return payload of each read under both layouts
+def read_payloads():
+    digest = cid_to_bytes32(IPFS_HASH)
+    metadata_digest = cid_to_bytes32(METADATA_IPFS_HASH)
+    old_enrollment = (1, ADDRESS, STUDENT_NAME, False, TIMESTAMP)
+    new_enrollment = (1, ADDRESS, False, TIMESTAMP)
+    payloads = {
+        'courses(i)': (
+            ['uint256', 'string', 'address', 'string', 'string', 'string', 'bool', 'uint256'],
+            [1, TITLE, ADDRESS, IPFS_HASH, TITLE, IPFS_HASH, True, FEE],
+            ['uint256', 'string', 'address', 'bool', 'bytes32', 'bytes32', 'uint256'],
+            [1, TITLE, ADDRESS, True, digest, digest, FEE],
+        ),
+        'getCertificate(i)': (
+            ['string', 'string', 'uint256'],
+            [IPFS_HASH, METADATA_IPFS_HASH, TIMESTAMP],
+            ['bytes32', 'bytes32', 'uint256'],
+            [digest, metadata_digest, TIMESTAMP],
+        ),
+        'getEnrollments(a), 3 courses': (
+            ['(uint256,address,string,bool,uint256)[]'],
+            [[old_enrollment] * 3],
+            ['(uint256,address,bool,uint256)[]'],
+            [[new_enrollment] * 3],
+        ),
+    }
+    return {
+        name: ((old_types, encode(old_types, old_values)), (new_types, encode(new_types, new_values)))
+        for name, (old_types, old_values, new_types, new_values) in payloads.items()
+    }
+
+# Function to time decoding a payload, in microseconds per call
+def decode_time(types, data):
+    return timeit.timeit(lambda: decode(types, data), number=DECODE_RUNS) / DECODE_RUNS * 1e6
+
+# Print the comparison
+def main():
+    print(f"{'Write':<36}{'Old gas':>10}{'New gas':>10}{'Saved':>8}")
+    for name, (old_gas, new_gas) in write_gas().items():
+        print(f"{name:<36}{old_gas:>10}{new_gas:>10}{1 - new_gas / old_gas:>8.0%}")
+    print()
+    print(f"{'Read':<36}{'Old bytes':>10}{'New bytes':>10}{'Old us':>8}{'New us':>8}{'Saved':>8}")
+    for name, ((old_types, old_data), (new_types, new_data)) in read_payloads().items():
+        old_time, new_time = decode_time(old_types, old_data), decode_time(new_types, new_data)
+        print(f"{name:<36}{len(old_data):>10}{len(new_data):>10}{old_time:>8.1f}{new_time:>8.1f}{1 - new_time / old_time:>8.0%}")
+
+# Execute the main function if the current script is being run as the main program
+if __name__ == "__main__":
+    main()
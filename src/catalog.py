@@ -0,0 +1,201 @@
+# Imports
+import threading
+import requests
+from ipfs_hash import bytes32_to_cid # Custom module to convert on-chain IPFS hashes
+from rpc import batch_results, contract_call, decode_call, iter_log_chunks # Custom module for batched JSON-RPC calls
+
+# Number of students whose enrollments are fetched per batched request
+STUDENT_BATCH_SIZE = 50
+
+# Compact record for a Course struct as returned by courses(i)
+class Course:
+    __slots__ = ('id', 'title', 'instructor', 'is_active', 'ipfs_hash', 'certificate_ipfs_hash', 'fee')
+
+    def __init__(self, id, title, instructor, is_active, ipfs_hash, certificate_ipfs_hash, fee):
+        self.id = id
+        self.title = title # Also the exam title
+        self.instructor = instructor
+        self.is_active = is_active
+        self.ipfs_hash = ipfs_hash # CIDv0 string
+        self.certificate_ipfs_hash = certificate_ipfs_hash # CIDv0 string
+        self.fee = fee # Fee in wei
+
+    # Build a record from the raw contract tuple (field order matches the Course struct)
+    @classmethod
+    def from_struct(cls, struct):
+        id, title, instructor, is_active, ipfs_hash, certificate_ipfs_hash, fee = struct
+        return cls(id, title, instructor, is_active, bytes32_to_cid(ipfs_hash), bytes32_to_cid(certificate_ipfs_hash), fee)
+
+# Compact record for an Enrollment struct as returned by getEnrollments(address)
+class Enrollment:
+    __slots__ = ('course_id', 'student', 'is_completed', 'enrollment_date', 'student_name')
+
+    def __init__(self, course_id, student, is_completed, enrollment_date, student_name=None):
+        self.course_id = course_id
+        self.student = student
+        self.is_completed = is_completed
+        self.enrollment_date = enrollment_date # Unix timestamp
+        self.student_name = student_name # Not stored on-chain, taken from the Enrolled event
+
+    # Build a record from the raw contract tuple (field order matches the Enrollment struct)
+    # The student is passed in separately, as raw batched results carry non-checksummed addresses
+    @classmethod
+    def from_struct(cls, struct, student):
+        course_id, _, is_completed, enrollment_date = struct
+        return cls(course_id, student, is_completed, enrollment_date)
+
+# In-memory catalog of courses and enrollments with hash indexes for O(1) lookups
+class Catalog:
+    __slots__ = ('courses', 'by_title', 'by_instructor', 'by_student', 'student_names', 'start_block', 'names_block', 'names_synced', 'is_syncing_names', 'names_error', '_lock')
+
+    def __init__(self):
+        self.courses = [] # Course records, list position == course ID
+        self.by_title = {} # title -> Course
+        self.by_instructor = {} # instructor address -> [Course]
+        self.by_student = {} # student address -> {course ID: Enrollment}
+        self.student_names = {} # (course ID, student address) -> name from the Enrolled event
+        self.start_block = 0 # Block the contract was deployed in, where event scans start
+        self.names_block = -1 # Last block scanned for Enrolled events
+        self.names_synced = False # Whether the Enrolled events up to the chain head have been scanned at least once
+        self.is_syncing_names = False
+        self.names_error = None # Message from the last failed scan
+        self._lock = threading.RLock() # Streamlit sessions run on separate threads
+
+    # Add a single course to the catalog and its indexes
+    def add_course(self, course):
+        with self._lock:
+            self.courses.append(course)
+            # Keep the first course for a title, matching the original linear scan
+            self.by_title.setdefault(course.title, course)
+            self.by_instructor.setdefault(course.instructor, []).append(course)
+
+    # Fetch only the courses created since the last sync
+    def sync_courses(self, contract):
+        course_count = contract.functions.courseCount().call()
+        with self._lock:
+            for course_id in range(len(self.courses), course_count):
+                self.add_course(Course.from_struct(contract.functions.courses(course_id).call()))
+        return self
+
+    # Retrieve a course by its ID
+    def course(self, course_id):
+        return self.courses[course_id]
+
+    # Retrieve a course by its title, or None if no such course exists
+    def course_by_title(self, title):
+        return self.by_title.get(title)
+
+    # Retrieve the titles of all courses in course ID order
+    def titles(self):
+        return [course.title for course in self.courses]
+
+    # Check if an address is the instructor of any course
+    def is_instructor(self, address):
+        return address in self.by_instructor
+
+    # Fetch only the Enrolled events emitted since the last sync, in bounded block ranges
+    # The lock is only held while each chunk is applied, so other sessions are not blocked by the queries
+    def sync_student_names(self, contract):
+        latest_block = contract.web3.eth.blockNumber
+        for end_block, events in iter_log_chunks([contract.events.Enrolled], self.names_block + 1, latest_block):
+            with self._lock:
+                for event in events:
+                    key = (event.args.courseId, event.args.student)
+                    # Keep the first name for an enrollment, matching the first enrollment kept below
+                    name = self.student_names.setdefault(key, event.args.studentName)
+                    enrollment = self.enrollment(event.args.student, event.args.courseId)
+                    if enrollment is not None and enrollment.student_name is None:
+                        enrollment.student_name = name
+                # Record progress per chunk so a failed query resumes where it stopped
+                self.names_block = end_block
+        self.names_synced = True
+
+    # Start scanning for Enrolled events on a background thread, unless a scan is already running
+    def start_name_sync(self, contract):
+        with self._lock:
+            if self.is_syncing_names:
+                return
+            self.is_syncing_names = True
+        threading.Thread(target=self._sync_names_in_background, args=(contract,), daemon=True).start()
+
+    def _sync_names_in_background(self, contract):
+        try:
+            self.sync_student_names(contract)
+            self.names_error = None
+        except (ValueError, requests.RequestException) as e:
+            self.names_error = str(e) # The scan resumes from the last completed chunk on the next attempt
+        finally:
+            self.is_syncing_names = False
+
+    # Index a student's Enrollment structs by course ID
+    def _index_enrollments(self, student, structs):
+        enrollments = {}
+        for struct in structs:
+            enrollment = Enrollment.from_struct(struct, student)
+            # Keep the first enrollment for a course, matching the original linear scan
+            enrollments.setdefault(enrollment.course_id, enrollment)
+        return enrollments
+
+    # Attach student names to freshly read enrollments and store them, keyed by student
+    def _store_enrollments(self, contract, student_enrollments):
+        # Names are immutable once emitted, so only scan for new events when one is missing
+        # The scan runs in the background; names it finds are attached to the stored enrollments
+        if any((course_id, student) not in self.student_names for student, enrollments in student_enrollments.items() for course_id in enrollments):
+            self.start_name_sync(contract)
+        # Attach and store under the lock, so a name found by the scan meanwhile is not missed
+        with self._lock:
+            for student, enrollments in student_enrollments.items():
+                for course_id, enrollment in enrollments.items():
+                    enrollment.student_name = self.student_names.get((course_id, student))
+            self.by_student.update(student_enrollments)
+        return student_enrollments
+
+    # Re-read a student's enrollments with a single call and re-index them by course ID
+    def refresh_enrollments(self, contract, student):
+        structs = contract.functions.getEnrollments(student).call()
+        return self._store_enrollments(contract, {student: self._index_enrollments(student, structs)})[student]
+
+    # Re-read the enrollments of several students with one batched request
+    def refresh_enrollments_batch(self, contract, students):
+        results = batch_results(contract.web3.provider, [contract_call(contract, 'getEnrollments', [student]) for student in students])
+        return self._store_enrollments(contract, {
+            student: self._index_enrollments(student, decode_call(contract, 'getEnrollments', result)[0])
+            for student, result in zip(students, results)
+        })
+
+    # Re-read the enrollments of every student known to the contract, returning a snapshot keyed by student
+    def sync_enrollments(self, contract):
+        students = contract.functions.getStudentAddresses().call()
+        for i in range(0, len(students), STUDENT_BATCH_SIZE):
+            self.refresh_enrollments_batch(contract, students[i:i + STUDENT_BATCH_SIZE])
+        with self._lock:
+            return dict(self.by_student)
+
+    # Find the course a student's certificate was issued for, or None if it matches none of their enrollments
+    # Token IDs count certificates, not courses, so the course is matched by certificate image and completion date
+    def course_for_certificate(self, contract, student, certificate_ipfs_hash, completion_date):
+        candidates = [
+            self.courses[course_id] for course_id in self.by_student.get(student, {})
+            if course_id < len(self.courses) and self.courses[course_id].certificate_ipfs_hash == certificate_ipfs_hash
+        ]
+        # Only courses sharing a certificate image need their completion dates compared
+        if len(candidates) > 1:
+            candidates = [course for course in candidates if contract.functions.getCompletionDate(course.id, student).call() == completion_date]
+        return candidates[0] if candidates else None
+
+    # Retrieve a student's enrollment in a course, or None if not enrolled
+    def enrollment(self, student, course_id):
+        return self.by_student.get(student, {}).get(course_id)
+
+# Shared catalog, kept across Streamlit reruns and sessions
+_catalog = Catalog()
+
+# Function to retrieve the shared catalog, fetching any newly created courses
+# Event logs are scanned from start_block, the block the contract was deployed in, starting in the background on first use
+def get_catalog(contract, start_block=0):
+    with _catalog._lock:
+        _catalog.start_block = start_block
+        _catalog.names_block = max(_catalog.names_block, start_block - 1)
+    if not _catalog.names_synced:
+        _catalog.start_name_sync(contract)
+    return _catalog.sync_courses(contract)
@@ -11,33 +11,41 @@ contract LearningPlatform is ERC721Enumerable {
     address public owner;
 
     // Define a Course struct with relevant properties
+    // IPFS hashes are stored as the 32-byte sha256 digest of a CIDv0 ("Qm...") multihash
+    // The exam is looked up by the course title, which must match the exam title
     struct Course {
         uint256 id;
         string title;
         address instructor;
-        string ipfsHash; // IPFS hash for course content
-        string examTitle;
-        string certificateIpfsHash; // IPFS hash for certificate
         bool isActive;
+        bytes32 ipfsHash; // IPFS hash for course content
+        bytes32 certificateIpfsHash; // IPFS hash for certificate
         uint256 fee;
     }
 
     // Define an Enrollment struct for tracking student enrollments
+    // The student name is emitted in the Enrolled event and kept in the certificate metadata
     struct Enrollment {
         uint256 courseId;
         address student;
-        string studentName;
         bool isCompleted;
         uint256 enrollmentDate;
     }
 
     // Define a Certificate struct for tracking issued certificates
     struct Certificate {
-        string certificateIpfsHash; // IPFS hash for the certificate
-        string metadataIpfsHash; // IPFS hash for the metadata
+        bytes32 certificateIpfsHash; // IPFS hash for the certificate
+        bytes32 metadataIpfsHash; // IPFS hash for the metadata
         uint256 completionDate;
     }
 
+    // Event emitted on enrollment, carrying the student name instead of storing it
+    event Enrolled(uint256 indexed courseId, address indexed student, string studentName);
+
+    // Events emitted when an exam result is recorded and when a certificate is issued, so analytics can follow them from the logs
+    event ExamResultRecorded(uint256 indexed courseId, address indexed student, bool isPassed);
+    event CertificateIssued(uint256 indexed courseId, address indexed student, uint256 certificateId);
+
     // Define a ExamResult struct to track student exam results
     struct ExamResult {
         uint256 courseId;
@@ -67,13 +75,13 @@ contract LearningPlatform is ERC721Enumerable {
     }
 
     // Function to create a new course, callable by anyone
-    function createCourse(string memory _title, address _instructor, string memory _ipfsHash, string memory _examTitle, string memory _certificateIpfsHash, uint256 _fee) public {
-        courses[courseCount] = Course(courseCount, _title, _instructor, _ipfsHash, _examTitle, _certificateIpfsHash, true, _fee);
+    function createCourse(string memory _title, address _instructor, bytes32 _ipfsHash, bytes32 _certificateIpfsHash, uint256 _fee) public {
+        courses[courseCount] = Course(courseCount, _title, _instructor, true, _ipfsHash, _certificateIpfsHash, _fee);
         courseCount++;
     }
 
     // Function to enroll in a course, verifies course availability and fee before enrolling
-    function enrollInCourse(uint256 _courseId, string memory _studentName) public payable {
+    function enrollInCourse(uint256 _courseId, string calldata _studentName) public payable {
         require(courses[_courseId].isActive, "Course not available");
         require(msg.value == courses[_courseId].fee, "Incorrect course fee");
         // Transfer the course fee to the instructor
@@ -88,11 +96,11 @@ contract LearningPlatform is ERC721Enumerable {
         Enrollment memory newEnrollment = Enrollment({
             courseId: _courseId,
             student: msg.sender,
-            studentName: _studentName,
             isCompleted: false,
             enrollmentDate: block.timestamp
         });
         enrollments[msg.sender].push(newEnrollment);
+        emit Enrolled(_courseId, msg.sender, _studentName);
     }
 
         // Function to retrieve enrollments for a specific student
@@ -117,7 +125,7 @@ contract LearningPlatform is ERC721Enumerable {
     }
 
     // Function to mark a course as completed and issue a certificate
-    function markCompletionAndIssueCertificate(uint256 _courseId, address _student, string memory _studentName, string memory _metadataIpfsHash) public {
+    function markCompletionAndIssueCertificate(uint256 _courseId, address _student, bytes32 _metadataIpfsHash) public {
         require(courses[_courseId].isActive, "Course not available");
         // Authorization check: Only the instructor, owner or student can issue certificates
         require(msg.sender == _student || courses[_courseId].instructor == msg.sender || msg.sender == owner, "Not authorized");
@@ -139,16 +147,17 @@ contract LearningPlatform is ERC721Enumerable {
         completionDates[_courseId][_student] = block.timestamp;
 
         // Get the certificate IPFS hash from the course
-        string memory certificateIpfsHash = courses[_courseId].certificateIpfsHash;
+        bytes32 certificateIpfsHash = courses[_courseId].certificateIpfsHash;
 
         // Issue Certificate with both the certificate & metadata IPFS hashes
         certificates[certificateCount] = Certificate(certificateIpfsHash, _metadataIpfsHash, block.timestamp);
         _mint(_student, certificateCount); // Mint the certificate as an NFT
+        emit CertificateIssued(_courseId, _student, certificateCount);
         certificateCount++;
     }
 
     // Function to issue a certificate for a passed exam
-    function issueCertificateForPassedExam(uint256 _courseId, address _student, string memory _metadataIpfsHash) public {
+    function issueCertificateForPassedExam(uint256 _courseId, address _student, bytes32 _metadataIpfsHash) public {
         // Check that the student passed the exam
         ExamResult memory examResult = examResults[_courseId][_student];
         require(examResult.isPassed, "Student did not pass the exam");
@@ -170,11 +179,12 @@ contract LearningPlatform is ERC721Enumerable {
         completionDates[_courseId][_student] = block.timestamp;
 
         // Get the certificate IPFS hash from the course
-        string memory certificateIpfsHash = courses[_courseId].certificateIpfsHash;
+        bytes32 certificateIpfsHash = courses[_courseId].certificateIpfsHash;
 
         // Issue Certificate with both the certificate & metadata IPFS hashes
         certificates[certificateCount] = Certificate(certificateIpfsHash, _metadataIpfsHash, block.timestamp);
         _mint(_student, certificateCount); // Mint the certificate as an NFT
+        emit CertificateIssued(_courseId, _student, certificateCount);
         certificateCount++;
     }
 
@@ -196,6 +206,7 @@ contract LearningPlatform is ERC721Enumerable {
 
         // Record the exam result
         examResults[_courseId][msg.sender] = ExamResult(_courseId, msg.sender, _isPassed, passedTimestamp);
+        emit ExamResultRecorded(_courseId, msg.sender, _isPassed);
     }
 
     // Function to retrieve the completion date for a specific course and student
@@ -204,15 +215,29 @@ contract LearningPlatform is ERC721Enumerable {
     }
 
     // Function to retrieve a specific certificate
-    function getCertificate(uint256 _certificateId) public view returns (string memory certificateIpfsHash, string memory metadataIpfsHash, uint256 completionDate) {
+    function getCertificate(uint256 _certificateId) public view returns (bytes32 certificateIpfsHash, bytes32 metadataIpfsHash, uint256 completionDate) {
         Certificate memory certificate = certificates[_certificateId];
         return (certificate.certificateIpfsHash, certificate.metadataIpfsHash, certificate.completionDate);
     }
 
-    // Override the tokenURI function to return the IPFS hash for the certificate metadata
+    // Override the tokenURI function to return the IPFS URI for the certificate metadata
+    // The digest is rendered as a base16 CIDv1 ("f" multibase, version 1, dag-pb codec, sha2-256 multihash),
+    // which resolves to the same content as the CIDv0 it was taken from
     function tokenURI(uint256 tokenId) public view override returns (string memory) {
         require(_exists(tokenId), "Token does not exist");
-        return certificates[tokenId].metadataIpfsHash;
+        return string(abi.encodePacked("ipfs://f01701220", toHexString(certificates[tokenId].metadataIpfsHash)));
+    }
+
+    // Function to render a bytes32 value as 64 lowercase hex characters
+    function toHexString(bytes32 _value) internal pure returns (string memory) {
+        bytes memory alphabet = "0123456789abcdef";
+        bytes memory hexString = new bytes(64);
+        for (uint i = 0; i < 32; i++) {
+            uint8 b = uint8(_value[i]);
+            hexString[i * 2] = alphabet[b >> 4];
+            hexString[i * 2 + 1] = alphabet[b & 0x0f];
+        }
+        return string(hexString);
     }
 
 } // End of contract
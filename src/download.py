@@ -1,5 +1,12 @@
 # Imports
+import os
+import tempfile
+import requests
+import multiprocessing
 from io import BytesIO
+from zipfile import ZipFile, ZIP_STORED
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image as PILImage # Installed with reportlab, used to check downloaded certificate images
 # Introducing new library to generate and download PDF files - 'reportlab'
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Image, Paragraph
@@ -7,8 +14,27 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER
 from reportlab.lib.pagesizes import landscape
+
+# Directory holding the local certificate templates, named after the course title
+CERTIFICATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'resources', 'certificates')
+
+# Directory caching certificate images fetched from IPFS, shared across batches
+IMAGE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'skillified_certificates')
+
+# Seconds to wait for the IPFS gateway to connect or send data when fetching a certificate image
+IMAGE_TIMEOUT = 30
+
+# Number of certificates per downloadable archive, as Streamlit holds each download in memory
+ZIP_PART_SIZE = 200
+
 # Function to generate PDF file
 def PDF(certificate_image, student_name, course_title, completion_date):
+    # Add the certificate image
+    certificate_image_path = f"https://ipfs.io/ipfs/{certificate_image}"
+    return build_pdf(certificate_image_path, student_name, course_title, completion_date)
+
+# Function to build a certificate PDF from an image URL or local path
+def build_pdf(certificate_image_path, student_name, course_title, completion_date):
     # Image dimensions
     image_width = 200
     image_height = 200
@@ -26,7 +52,6 @@ def PDF(certificate_image, student_name, course_title, completion_date):
     elements = []
 
     # Add the certificate image
-    certificate_image_path = f"https://ipfs.io/ipfs/{certificate_image}"
     img = Image(certificate_image_path, width=image_width, height=image_height)
     elements.append(img)
 
@@ -53,9 +78,69 @@ def PDF(certificate_image, student_name, course_title, completion_date):
     # Return the buffer
     return buffer
 
-
-
-
-
-
-
+# Function to find the local certificate template for a course, e.g. "Blockchain & Web3" -> "blockchain&web3_certificate.png"
+def certificate_template(course_title):
+    template_name = course_title.lower().replace(' & ', '&').replace(' ', '_')
+    template_path = os.path.join(CERTIFICATES_DIR, f"{template_name}_certificate.png")
+    return template_path if os.path.exists(template_path) else None
+
+# Function to fetch a certificate image from IPFS once and return its cached path
+def cached_certificate_image(certificate_image):
+    image_path = os.path.join(IMAGE_CACHE_DIR, certificate_image)
+    if not os.path.exists(image_path):
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        response = requests.get(f"https://ipfs.io/ipfs/{certificate_image}", stream=True, timeout=IMAGE_TIMEOUT)
+        response.raise_for_status()
+        # Write to a temporary name first so a failed download is never mistaken for a cached image
+        with tempfile.NamedTemporaryFile(dir=IMAGE_CACHE_DIR, delete=False) as f:
+            try:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        # A gateway error page can come back with a success status, so only cache a readable image
+        try:
+            with PILImage.open(f.name) as image:
+                image.verify()
+        except Exception:
+            os.remove(f.name)
+            raise ValueError(f"The certificate image {certificate_image} could not be read from IPFS")
+        os.replace(f.name, image_path)
+    return image_path
+
+# Function to build a file name for a certificate inside the archive
+def certificate_file_name(certificate_id, student_name):
+    safe_name = ''.join(char if char.isalnum() else '_' for char in student_name or 'certificate')
+    return f"{certificate_id}_{safe_name}.pdf"
+
+# Function run on the process pool to render one certificate, returning its file name and PDF bytes
+def render_certificate(file_name, certificate_image_path, student_name, course_title, completion_date):
+    return file_name, build_pdf(certificate_image_path, student_name, course_title, completion_date).getvalue()
+
+# Function to render certificates in parallel and stream them into a ZIP archive as they finish
+# certificates yields (file name, certificate IPFS hash, student name, course title, completion date)
+def PDFZip(certificates, file, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_workers * 2 # Bound the number of rendered PDFs held in memory at once
+    image_paths = {} # certificate IPFS hash -> local image path
+
+    # Spawn rather than fork, as the Streamlit server process is multi-threaded
+    # PDFs embed already-compressed images, so they are stored rather than deflated
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool, ZipFile(file, 'w', ZIP_STORED) as archive:
+        pending = set()
+        for file_name, certificate_image, student_name, course_title, completion_date in certificates:
+            if certificate_image not in image_paths:
+                image_paths[certificate_image] = certificate_template(course_title) or cached_certificate_image(certificate_image)
+            pending.add(pool.submit(render_certificate, file_name, image_paths[certificate_image], student_name, course_title, completion_date))
+
+            # Wait for a slot before submitting more, writing out whatever has finished
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    archive.writestr(*future.result())
+
+        for future in wait(pending).done:
+            archive.writestr(*future.result())
+    return file
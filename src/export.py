@@ -0,0 +1,167 @@
+# Imports
+import os
+import csv
+import tempfile
+from datetime import datetime
+from itertools import islice
+from ipfs_hash import bytes32_to_cid # Custom module to convert on-chain IPFS hashes
+from catalog import STUDENT_BATCH_SIZE # Custom module with the indexed course & enrollment catalog
+from rpc import batch_results, contract_call, decode_call # Custom module for batched JSON-RPC calls
+
+# Address the contract returns for fields that were never written
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+# Columns written for every enrollment, in output order
+EXPORT_COLUMNS = [
+    'course_id',
+    'course_title',
+    'student_address',
+    'student_name',
+    'enrollment_date',
+    'exam_status',
+    'passed_date',
+    'completion_date',
+    'certificate_id',
+]
+
+# Supported export formats: display name -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Number of rows buffered before each write (one Parquet row group per chunk)
+CHUNK_SIZE = 10000
+
+# Function to format a Unix timestamp, returning None for unset (zero) timestamps
+def format_timestamp(timestamp):
+    return datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d') if timestamp else None
+
+# Function to map each student's certificates to token IDs, keyed by (certificate IPFS hash, completion date)
+# Uses three batched requests for all of the students: token counts, token IDs, then certificates
+def certificate_ids(contract, students):
+    provider = contract.web3.provider
+    token_counts = batch_results(provider, [contract_call(contract, 'balanceOf', [student]) for student in students])
+    owned = [(student, i) for student, token_count in zip(students, token_counts) for i in range(int(token_count, 16))]
+    token_ids = [
+        decode_call(contract, 'tokenOfOwnerByIndex', result)[0]
+        for result in batch_results(provider, [contract_call(contract, 'tokenOfOwnerByIndex', [student, i]) for student, i in owned])
+    ]
+    certificates = batch_results(provider, [contract_call(contract, 'getCertificate', [token_id]) for token_id in token_ids])
+
+    ids = {student: {} for student in students}
+    for (student, _), token_id, result in zip(owned, token_ids, certificates):
+        certificate_ipfs_hash, _, completion_date = decode_call(contract, 'getCertificate', result)
+        ids[student][(bytes32_to_cid(certificate_ipfs_hash), completion_date)] = token_id
+    return ids
+
+# Generator yielding, per batch of students, the raw (course, enrollment, exam result, completion date) of each enrollment
+# Each batch costs two batched requests (enrollments, then exam results and completion dates), optionally restricted to a set of course IDs
+def iter_enrollment_batches(contract, catalog, course_ids=None):
+    students = contract.functions.getStudentAddresses().call()
+    for i in range(0, len(students), STUDENT_BATCH_SIZE):
+        student_enrollments = catalog.refresh_enrollments_batch(contract, students[i:i + STUDENT_BATCH_SIZE])
+        enrollments = [
+            enrollment
+            for enrollments in student_enrollments.values() for enrollment in enrollments.values()
+            if course_ids is None or enrollment.course_id in course_ids
+        ]
+        calls = []
+        for enrollment in enrollments:
+            calls.append(contract_call(contract, 'examResults', [enrollment.course_id, enrollment.student]))
+            calls.append(contract_call(contract, 'getCompletionDate', [enrollment.course_id, enrollment.student]))
+        results = batch_results(contract.web3.provider, calls)
+        yield [
+            (catalog.course(enrollment.course_id), enrollment, decode_call(contract, 'examResults', exam_result), decode_call(contract, 'getCompletionDate', completion_date)[0])
+            for enrollment, exam_result, completion_date in zip(enrollments, results[0::2], results[1::2])
+        ]
+
+# Generator yielding the raw (course, enrollment, exam result, completion date) for every enrollment
+def iter_enrollment_records(contract, catalog, course_ids=None):
+    for records in iter_enrollment_batches(contract, catalog, course_ids):
+        yield from records
+
+# Generator yielding one row per enrollment, optionally restricted to a set of course IDs
+def iter_enrollment_rows(contract, catalog, course_ids=None):
+    for records in iter_enrollment_batches(contract, catalog, course_ids):
+        # Certificate IDs are only needed for students with a completed course
+        completed_students = list({enrollment.student for _, enrollment, _, completion_date in records if completion_date})
+        certificates = certificate_ids(contract, completed_students) if completed_students else {}
+
+        for course, enrollment, exam_result, completion_date in records:
+            status = "Not Attempted"
+            if exam_result[1] != ZERO_ADDRESS:  # The student is only set once a result is recorded
+                status = "Passed" if exam_result[2] else "Failed"
+
+            # Match the certificate minted on completion by its IPFS hash and completion date
+            certificate_id = None
+            if completion_date:
+                certificate_id = certificates[enrollment.student].get((course.certificate_ipfs_hash, completion_date))
+
+            yield {
+                'course_id': course.id,
+                'course_title': course.title,
+                'student_address': enrollment.student,
+                'student_name': enrollment.student_name,
+                'enrollment_date': format_timestamp(enrollment.enrollment_date),
+                'exam_status': status,
+                'passed_date': format_timestamp(exam_result[3]),
+                'completion_date': format_timestamp(completion_date),
+                'certificate_id': certificate_id,
+            }
+
+# Generator grouping rows into lists of at most chunk_size rows
+def iter_chunks(rows, chunk_size=CHUNK_SIZE):
+    rows = iter(rows)
+    chunk = list(islice(rows, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, chunk_size))
+
+# Function to stream rows into a CSV file, one chunk at a time
+def write_csv(rows, path, chunk_size=CHUNK_SIZE):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for chunk in iter_chunks(rows, chunk_size):
+            writer.writerows(chunk)
+
+# Function to stream rows into a Parquet file, writing one row group per chunk
+def write_parquet(rows, path, chunk_size=CHUNK_SIZE):
+    # Introducing new library to write Parquet files - 'pyarrow'
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('course_id', pa.int64()),
+        ('course_title', pa.string()),
+        ('student_address', pa.string()),
+        ('student_name', pa.string()),
+        ('enrollment_date', pa.string()),
+        ('exam_status', pa.string()),
+        ('passed_date', pa.string()),
+        ('completion_date', pa.string()),
+        ('certificate_id', pa.int64()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(rows, chunk_size):
+            # Transpose the chunk into columns before handing it to Arrow
+            columns = {column: [row[column] for row in chunk] for column in EXPORT_COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+# Function to export enrollments to a temporary file in the given format, returning its path
+# The caller removes the file once it has been served; it is removed here if the export fails
+def export_enrollments(contract, catalog, export_format, course_ids=None, chunk_size=CHUNK_SIZE):
+    extension, _ = EXPORT_FORMATS[export_format]
+    with tempfile.NamedTemporaryFile(suffix=f'.{extension}', delete=False) as f:
+        path = f.name
+    try:
+        rows = iter_enrollment_rows(contract, catalog, course_ids)
+        if export_format == 'Parquet':
+            write_parquet(rows, path, chunk_size)
+        else:
+            write_csv(rows, path, chunk_size)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,35 @@
+# Base58 (Bitcoin) alphabet used by CIDv0 IPFS hashes
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+# Multihash prefix for a sha2-256 digest: hash function code 0x12, digest length 0x20 (32 bytes)
+SHA256_MULTIHASH_PREFIX = b'\x12\x20'
+
+# Value the contract returns for an IPFS hash that was never set
+EMPTY_BYTES32 = bytes(32)
+
+# Function to convert a CIDv0 IPFS hash ("Qm...") to the 32-byte digest stored on-chain
+def cid_to_bytes32(cid):
+    if len(cid) != 46 or not cid.startswith('Qm'):
+        raise ValueError(f"Unsupported IPFS hash {cid!r}: only CIDv0 sha2-256 hashes can be stored on-chain")
+    number = 0
+    for char in cid:
+        digit = BASE58_ALPHABET.find(char)
+        if digit == -1:
+            raise ValueError(f"Invalid character {char!r} in IPFS hash {cid!r}")
+        number = number * 58 + digit
+    multihash = number.to_bytes(34, 'big')
+    if multihash[:2] != SHA256_MULTIHASH_PREFIX:
+        raise ValueError(f"Unsupported IPFS hash {cid!r}: only CIDv0 sha2-256 hashes can be stored on-chain")
+    return multihash[2:]
+
+# Function to convert a 32-byte digest read from the contract back to a CIDv0 IPFS hash, or None if unset
+def bytes32_to_cid(digest):
+    if digest == EMPTY_BYTES32:
+        return None
+    number = int.from_bytes(SHA256_MULTIHASH_PREFIX + digest, 'big')
+    chars = []
+    while number:
+        number, digit = divmod(number, 58)
+        chars.append(BASE58_ALPHABET[digit])
+    # The multihash prefix has no leading zero bytes, so no leading '1' characters are needed
+    return ''.join(reversed(chars))
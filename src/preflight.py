@@ -0,0 +1,76 @@
+# Imports
+import requests
+from rpc import rpc_batch, contract_call, decode_call # Custom module for batched JSON-RPC calls
+
+# Headroom added to the node's gas estimate, as state can change between the estimate and the transaction
+GAS_HEADROOM = 1.2
+
+# Outcome of the pre-flight checks for a transaction
+class Preflight:
+    __slots__ = ('ok', 'error', 'is_enrolled', 'gas', 'gas_price')
+
+    def __init__(self, ok, error=None, is_enrolled=False, gas=None, gas_price=None):
+        self.ok = ok
+        self.error = error # Message to show the user when the transaction should not be sent
+        self.is_enrolled = is_enrolled
+        self.gas = gas # Gas limit (estimate plus headroom), sent with the transaction so the node is not asked again
+        self.gas_price = gas_price # Gas price the balance was checked against, sent with the transaction
+
+# Function to retrieve the error message of a failed batched request, or None if it succeeded
+def response_error(response):
+    if 'result' in response:
+        return None
+    return response.get('error', {}).get('message', "No result returned")
+
+# Function to check an enrollment with one batched request and simulate it before it is sent
+def preflight_enrollment(contract, student, course_id, student_name, fee):
+    transaction = {
+        'from': student,
+        'to': contract.address,
+        'value': hex(fee),
+        'data': contract.encodeABI(fn_name='enrollInCourse', args=[course_id, student_name]),
+    }
+    try:
+        enrollments, course, balance, gas_price, gas, simulation = rpc_batch(contract.web3.provider, [
+            contract_call(contract, 'getEnrollments', [student]),
+            contract_call(contract, 'courses', [course_id]),
+            ('eth_getBalance', [student, 'latest']),
+            ('eth_gasPrice', []),
+            ('eth_estimateGas', [transaction]),
+            ('eth_call', [transaction, 'latest']), # Simulate the enrollment itself
+        ])
+    except (ValueError, requests.RequestException) as e:
+        return Preflight(False, f"Could not check the enrollment: {e}")
+
+    # Reads that should never fail; if they do, the node is unavailable
+    for response in (enrollments, course, balance, gas_price):
+        error = response_error(response)
+        if error:
+            return Preflight(False, f"Could not check the enrollment: {error}")
+
+    # Enrollment state comes from the chain rather than the session
+    (student_enrollments,) = decode_call(contract, 'getEnrollments', enrollments['result'])
+    if any(enrollment[0] == course_id for enrollment in student_enrollments):
+        return Preflight(False, "You are already enrolled in this course.", is_enrolled=True)
+
+    is_active = decode_call(contract, 'courses', course['result'])[3] # isActive is at index 3
+    if not is_active:
+        return Preflight(False, "This course is not available.")
+
+    balance = int(balance['result'], 16)
+    if balance < fee:
+        return Preflight(False, "You have insufficient funds to enroll in this course.")
+
+    # Estimating gas executes the call, so an error here means the transaction would revert
+    for response in (gas, simulation):
+        error = response_error(response)
+        if error:
+            return Preflight(False, f"The enrollment would fail: {error}")
+
+    # The transaction is sent with this gas limit and price, so the balance check covers its full cost
+    gas = int(int(gas['result'], 16) * GAS_HEADROOM)
+    gas_price = int(gas_price['result'], 16)
+    if balance < fee + gas * gas_price:
+        return Preflight(False, "You have insufficient funds to cover the course fee and gas.")
+
+    return Preflight(True, gas=gas, gas_price=gas_price)
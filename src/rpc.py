@@ -0,0 +1,66 @@
+# Imports
+import requests
+
+# Seconds to wait for a batched JSON-RPC response when the provider sets no timeout of its own
+RPC_TIMEOUT = 30
+
+# Number of blocks scanned per eth_getLogs request, as hosted nodes cap the range of a single query
+LOG_BLOCK_RANGE = 2000
+
+# Function to build the ABI type string for a function output, expanding tuples
+def abi_type(output):
+    if output['type'].startswith('tuple'):
+        components = ','.join(abi_type(component) for component in output['components'])
+        return f"({components}){output['type'][len('tuple'):]}"
+    return output['type']
+
+# Function to build an eth_call request for a contract function, for use in rpc_batch
+def contract_call(contract, fn_name, args):
+    return ('eth_call', [{'to': contract.address, 'data': contract.encodeABI(fn_name=fn_name, args=args)}, 'latest'])
+
+# Function to decode the result of an eth_call against a contract function
+def decode_call(contract, fn_name, result):
+    outputs = contract.get_function_by_name(fn_name).abi['outputs']
+    return contract.web3.codec.decode_abi([abi_type(output) for output in outputs], bytes.fromhex(result[2:]))
+
+# Function to send several JSON-RPC requests in a single HTTP batch, returning responses in request order
+# web3's HTTPProvider has no batch support, so the batch is posted directly to the provider's endpoint,
+# reusing its request kwargs (headers, timeout); other provider types (IPC, WebSocket) are not supported
+# Raises ValueError when the node rejects the batch as a whole, and requests.RequestException on transport errors
+def rpc_batch(provider, calls):
+    payload = [{'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params} for i, (method, params) in enumerate(calls)]
+    request_kwargs = dict(provider.get_request_kwargs())
+    request_kwargs.setdefault('timeout', RPC_TIMEOUT)
+    response = requests.post(provider.endpoint_uri, json=payload, **request_kwargs)
+    response.raise_for_status()
+    responses = response.json()
+
+    # A rejected batch comes back as a single error object rather than a list
+    if not isinstance(responses, list):
+        error = responses.get('error', {}).get('message', responses) if isinstance(responses, dict) else responses
+        raise ValueError(f"The node rejected the batch request: {error}")
+    if len(responses) != len(calls):
+        raise ValueError(f"The node answered {len(responses)} of {len(calls)} batched requests")
+
+    # Batch responses may arrive in any order
+    return sorted(responses, key=lambda item: item['id'])
+
+# Function to send a batch of calls that must all succeed, returning their results in request order
+def batch_results(provider, calls):
+    # An empty batch is itself an invalid request
+    if not calls:
+        return []
+    results = []
+    for response in rpc_batch(provider, calls):
+        if 'result' not in response:
+            raise ValueError(f"Batched request failed: {response.get('error', {}).get('message', 'no result returned')}")
+        results.append(response['result'])
+    return results
+
+# Generator yielding (last block scanned, logs) for each bounded chunk of blocks between two blocks (inclusive)
+# The logs of all of the given events are merged in the order they were emitted
+def iter_log_chunks(events, from_block, to_block, block_range=LOG_BLOCK_RANGE):
+    for start in range(from_block, to_block + 1, block_range):
+        end = min(start + block_range - 1, to_block)
+        logs = [log for event in events for log in event.getLogs(fromBlock=start, toBlock=end)]
+        yield end, sorted(logs, key=lambda log: (log.blockNumber, log.logIndex))
@@ -1,21 +1,30 @@
 # Imports
 import os
 import json
+import tempfile
 import requests
 from web3 import Web3
 import streamlit as st
 from io import BytesIO
+from zipfile import ZipFile
+from itertools import islice
 from exams import Exams # Custom module containing exams
 from datetime import datetime
 from dotenv import load_dotenv
 from metadata import create_metadata, pin_to_ipfs # Custom module to create metadata
-from download import PDF # Custom module to create PDF
+from download import PDF, PDFZip, ZIP_PART_SIZE, certificate_file_name # Custom module to create PDF
+from catalog import get_catalog # Custom module with the indexed course & enrollment catalog
+from export import EXPORT_FORMATS, export_enrollments, iter_enrollment_rows # Custom module to export enrollments
+from analytics import get_analytics # Custom module with incremental per-course analytics
+from ipfs_hash import cid_to_bytes32, bytes32_to_cid # Custom module to convert IPFS hashes to and from their on-chain form
+from preflight import preflight_enrollment # Custom module to check transactions before they are sent
 
 # Load environment variables
 load_dotenv()
 
 WEB3_RPC = os.getenv('WEB3_RPC')
 SMART_CONTRACT_ADDRESS = os.getenv('SMART_CONTRACT_ADDRESS')
+CONTRACT_DEPLOYMENT_BLOCK = int(os.getenv('CONTRACT_DEPLOYMENT_BLOCK', 0)) # First block scanned for contract events
 PINATA_API_KEY = os.getenv('PINATA_API_KEY')
 PINATA_SECRET_API_KEY = os.getenv('PINATA_SECRET_API_KEY')
 
@@ -29,6 +38,12 @@ with open('contracts/compiled/contract_abi.json') as f:
 # Instantiate contract
 learning_platform = w3.eth.contract(address=SMART_CONTRACT_ADDRESS, abi=contract_abi)
 
+# Load the shared course catalog, fetching only courses created since the last rerun
+catalog = get_catalog(learning_platform, CONTRACT_DEPLOYMENT_BLOCK)
+
+# Load the shared per-course analytics
+analytics = get_analytics()
+
 # Declare accounts as global variable to be accessed by mutiple functions
 accounts = w3.eth.accounts
 
@@ -64,17 +79,60 @@ def authenticate():
 
 # Function to ensure admin cannot create duplicate courses
 def is_course_title_duplicate(course_title):
-    # Retrieve available courses
-    course_count = learning_platform.functions.courseCount().call()
-    for i in range(course_count):
-        existing_course_title = learning_platform.functions.courses(i).call()[1] # Title is at index 1
-        if existing_course_title == course_title:
-            return True
+    # Look up the title in the catalog's title index
+    return catalog.course_by_title(course_title) is not None
+
+# Function to check that the student names written to exports and certificates have been loaded, reporting progress otherwise
+def student_names_loaded():
+    if catalog.names_synced:
+        return True
+    if catalog.names_error:
+        st.error(f"Could not load student names from the blockchain, retrying: {catalog.names_error}")
+        catalog.start_name_sync(learning_platform)
+    else:
+        st.info("Student names are still being loaded from the blockchain. Please try again shortly.")
     return False
 
+# Function to display the per-course analytics dashboard
+def analytics_dashboard():
+    st.subheader('Course Analytics')
+
+    # Build the aggregates from the chain once in the background, or on request; afterwards new on-chain events are applied on each render
+    if (not analytics.is_built and analytics.build_error is None) or st.button('Rebuild Analytics'):
+        analytics.start_rebuild(learning_platform, catalog)
+
+    if analytics.build_error:
+        st.error(f"Could not build the analytics: {analytics.build_error}")
+    if not analytics.is_built:
+        if analytics.is_building:
+            st.info("The analytics are being built from the blockchain. Refresh the page to see them once they are ready.")
+        return
+
+    try:
+        analytics.sync(learning_platform, catalog)
+    except (ValueError, requests.RequestException) as e:
+        st.warning(f"Could not load the latest activity, showing the analytics as of block {analytics.synced_block}: {e}")
+
+    rows = []
+    for course, stats in analytics.summary(catalog):
+        average_days = stats.average_days_to_completion
+        rows.append({
+            'Course': course.title,
+            'Enrollments': stats.enrollments,
+            'Pass Rate': f"{stats.pass_rate:.0%}",
+            'Completions': stats.completed,
+            'Avg. Days to Completion': f"{average_days:.1f}" if average_days is not None else "-",
+            'Revenue (ETH)': str(Web3.fromWei(stats.revenue, 'ether')),
+        })
+    if rows:
+        st.table(rows)
+    else:
+        st.info("No courses are available at this time.")
+
 # Admin panel
 def admin_panel(user_address):
     st.title('Admin Portal')
+    analytics_dashboard()
     course_title = st.text_input('Course Title')
     instructor_address = st.selectbox('Select The Instructors Address:', accounts)
     course_file = st.file_uploader('Upload Course Material')
@@ -118,7 +176,10 @@ def admin_panel(user_address):
         if ipfs_hash and certificate_ipfs_hash:
             # Convert the fee to Wei
             fee_in_wei = w3.toWei(course_fee, 'ether')
-            tx_hash = learning_platform.functions.createCourse(course_title, instructor_address, ipfs_hash['IpfsHash'], selected_exam_title, certificate_ipfs_hash['IpfsHash'], fee_in_wei).transact({'from': user_address})
+            # The exam is looked up by the course title, which matches the selected exam title
+            tx_hash = learning_platform.functions.createCourse(course_title, instructor_address, cid_to_bytes32(ipfs_hash['IpfsHash']), cid_to_bytes32(certificate_ipfs_hash['IpfsHash']), fee_in_wei).transact({'from': user_address})
+            # Add the new course to the catalog
+            catalog.sync_courses(learning_platform)
             # Update progress to 100% after course creation is complete
             progress_bar.progress(100)
             st.success(f"Course Created! Transaction Hash: {tx_hash.hex()}")
@@ -130,8 +191,8 @@ def admin_panel(user_address):
 def instructor_panel(user_address):
     st.title('Instructor Portal')
 
-    # Get the course count from the contract
-    course_count = learning_platform.functions.courseCount().call()
+    # Get the course count from the catalog
+    course_count = len(catalog.courses)
 
     # Check if there are any courses available
     if course_count == 0:
@@ -139,11 +200,7 @@ def instructor_panel(user_address):
         return  # Exit the function since no courses are available
 
     # Check if the user is an instructor for any course
-    is_instructor = False
-    for i in range(course_count):
-        if user_address == learning_platform.functions.courses(i).call()[2]:  # Instructor address is at index 2
-            is_instructor = True
-            break
+    is_instructor = catalog.is_instructor(user_address)
 
     # Check if the user is the admin
     is_admin = user_address == learning_platform.functions.owner().call()
@@ -151,14 +208,13 @@ def instructor_panel(user_address):
     # Button to display all courses and the students enrolled
     if st.button('View Enrollments'):
         if is_admin or is_instructor:
-            student_addresses = learning_platform.functions.getStudentAddresses().call()
-            for student_address in student_addresses:
-                enrollments = learning_platform.functions.getEnrollments(student_address).call()
-                for enrollment in enrollments:
-                    course_id = enrollment[0]
-                    student_name = enrollment[2]
-                    course_title = learning_platform.functions.courses(course_id).call()[1]  # Title is at index 1
-                    enrollment_date = datetime.utcfromtimestamp(enrollment[4]).strftime('%Y-%m-%d')  # Enrollment date is at index 4
+            student_enrollments = catalog.sync_enrollments(learning_platform)
+            for student_address, enrollments in student_enrollments.items():
+                for enrollment in enrollments.values():
+                    course_id = enrollment.course_id
+                    student_name = enrollment.student_name
+                    course_title = catalog.course(course_id).title
+                    enrollment_date = datetime.utcfromtimestamp(enrollment.enrollment_date).strftime('%Y-%m-%d')
                     quiz_result = learning_platform.functions.examResults(course_id, student_address).call()
                     is_passed = quiz_result[2]
                     completion_date_timestamp = learning_platform.functions.getCompletionDate(course_id, student_address).call()
@@ -174,6 +230,81 @@ def instructor_panel(user_address):
         else:
             st.warning("Only the Contract Owner/Instructor can view Enrollments")
 
+    # Section to export enrollments, exam results, completion dates and certificate IDs
+    st.subheader('Export Enrollments')
+    export_format = st.selectbox('Select Export Format:', list(EXPORT_FORMATS))
+    if st.button('Export Enrollments'):
+        if not (is_admin or is_instructor):
+            st.warning("Only the Contract Owner/Instructor can export Enrollments")
+        elif student_names_loaded():
+            extension, mime = EXPORT_FORMATS[export_format]
+            # Instructors can only export the enrollments of their own courses
+            export_course_ids = None if is_admin else {course.id for course in catalog.by_instructor.get(user_address, [])}
+            # Stream the rows to a temporary file rather than building them up in memory
+            try:
+                with st.spinner('Exporting Enrollments...'):
+                    export_path = export_enrollments(learning_platform, catalog, export_format, export_course_ids)
+            except (ValueError, requests.RequestException) as e:
+                st.error(f"Failed to export Enrollments: {e}")
+            else:
+                try:
+                    with open(export_path, 'rb') as export_file:
+                        st.download_button(
+                            label="Download Enrollments",
+                            data=export_file,
+                            file_name=f"enrollments.{extension}",
+                            mime=mime,
+                        )
+                finally:
+                    os.remove(export_path)
+
+    # Section to download every certificate issued for a course as one archive
+    st.subheader('Download Course Certificates')
+    certificates_course_title = st.selectbox('Select Course to Download Certificates:', catalog.titles())
+    # Large courses are downloaded in parts, so each archive held by Streamlit stays bounded
+    certificates_part = st.number_input(f'Archive Part ({ZIP_PART_SIZE} Certificates Each):', min_value=1, step=1)
+    if st.button('Download Course Certificates'):
+        certificates_course = catalog.course_by_title(certificates_course_title)
+        if not (is_admin or certificates_course.instructor == user_address):
+            st.warning("Only the Contract Owner/Course Instructor can download Certificates")
+        elif student_names_loaded():
+            # Only enrollments with an issued certificate are rendered
+            all_certificates = (
+                (certificate_file_name(row['certificate_id'], row['student_name']), certificates_course.certificate_ipfs_hash, row['student_name'], row['course_title'], row['completion_date'])
+                for row in iter_enrollment_rows(learning_platform, catalog, {certificates_course.id})
+                if row['certificate_id'] is not None
+            )
+            part_start = (certificates_part - 1) * ZIP_PART_SIZE
+            certificates = islice(all_certificates, part_start, part_start + ZIP_PART_SIZE)
+            # Render on a process pool, streaming the PDFs into a temporary ZIP file as they finish
+            # The file is removed however rendering ends, including when fetching the certificate image fails
+            with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as zip_file:
+                zip_path = zip_file.name
+            try:
+                with open(zip_path, 'wb') as archive_file, st.spinner('Rendering Certificates...'):
+                    PDFZip(certificates, archive_file)
+                with ZipFile(zip_path) as archive:
+                    certificate_count = len(archive.namelist())
+                has_more = next(all_certificates, None) is not None
+            # Image and PDF errors from the rendering workers are OSErrors, as are request errors
+            except (ValueError, OSError) as e:
+                st.error(f"Failed to render Certificates: {e}")
+            else:
+                if certificate_count == 0:
+                    st.info(f"There are no certificates in part {certificates_part} for the course {certificates_course_title}.")
+                else:
+                    with open(zip_path, 'rb') as certificates_file:
+                        st.download_button(
+                            label=f"Download Certificates {part_start + 1}-{part_start + certificate_count}",
+                            data=certificates_file,
+                            file_name=f"{certificates_course_title}_certificates_part{certificates_part}.zip",
+                            mime="application/zip",
+                        )
+                if has_more:
+                    st.info(f"More certificates remain. Select part {certificates_part + 1} to download the next {ZIP_PART_SIZE}.")
+            finally:
+                os.remove(zip_path)
+
     # Let the user select address from a dropdown
     student_address = st.selectbox('Select Student Address:', accounts)
 
@@ -188,35 +319,29 @@ def instructor_panel(user_address):
         # If everything is fine, proceed to call the function
         enrollments = learning_platform.functions.getEnrollments(student_address).call()
 
-    # Retrieve available courses and create a mapping from title to ID
-    course_options = []
-    for i in range(course_count):
-        course = learning_platform.functions.courses(i).call()
-        course_title = course[1]
-        course_options.append(course_title)
+    # Retrieve available course titles
+    course_options = catalog.titles()
 
     # Dropdown to select a course by title
     selected_course_title = st.selectbox('Course Name', course_options)
 
     # Find the corresponding course ID and student name from the student's enrollments
-    enrollments = learning_platform.functions.getEnrollments(student_address).call()
-    course_id = None
-    student_name = None
-    for enrollment in enrollments:
-        enrolled_course_id = enrollment[0]
-        enrolled_course_title = learning_platform.functions.courses(enrolled_course_id).call()[1]
-        if enrolled_course_title == selected_course_title:
-            course_id = enrolled_course_id
-            student_name = enrollment[2]  # Getting the student name from enrollment
-            break
+    catalog.refresh_enrollments(learning_platform, student_address)
+    selected_course = catalog.course_by_title(selected_course_title)
+    enrollment = catalog.enrollment(student_address, selected_course.id) if selected_course else None
+    course_id = enrollment.course_id if enrollment else None
+    student_name = enrollment.student_name if enrollment else None  # Getting the student name from enrollment
 
     # Check if the student is enrolled in the selected course
-    if course_id is None or student_name is None:
+    if enrollment is None:
         st.error(f"The student is not enrolled in the course {selected_course_title}. You cannot mark completion and issue a certificate.")
+    # The name printed on the certificate is read from the Enrolled event logs, which may not have been scanned yet
+    elif student_name is None:
+        st.error("The student's name could not be loaded from the blockchain yet. Please try again shortly.")
     else:
-        if st.button('Mark Completion and Issue Certificate') and course_id is not None and student_name is not None:
+        if st.button('Mark Completion and Issue Certificate') and enrollment is not None:
             # Check if the student is enrolled in the selected course
-            if course_id is None or student_name is None:
+            if enrollment is None:
                 st.error(f"The student is not enrolled in the course {selected_course_title}. You cannot mark completion and issue a certificate.")
                 return
 
@@ -229,7 +354,8 @@ def instructor_panel(user_address):
             st.error(f"The student has already completed the course {selected_course_title}. You cannot mark completion and issue a certificate more than once.")
             return
 
-        instructor_address = learning_platform.functions.courses(course_id).call()[2]
+        selected_course_details = catalog.course(course_id)
+        instructor_address = selected_course_details.instructor
         if user_address != instructor_address and user_address != learning_platform.functions.owner().call():
             st.error("You are not authorised to mark completion or issue a certificate for this course.")
             return
@@ -238,12 +364,10 @@ def instructor_panel(user_address):
         progress_bar = st.progress(0)
         progress_text = st.empty()
 
-        # # Retrieve the course details using the selected course ID - Incremental progress
-        selected_course_details = learning_platform.functions.courses(course_id).call()
         progress_bar.progress(10)
 
         # Extract course fee in ETH - Incremental progress
-        selected_course_fee_in_wei = selected_course_details[7] # Adjust the index according to your contract structure
+        selected_course_fee_in_wei = selected_course_details.fee
         selected_course_fee = Web3.fromWei(selected_course_fee_in_wei, 'ether')
         progress_bar.progress(20)
 
@@ -251,7 +375,6 @@ def instructor_panel(user_address):
         enrollment_date_timestamp = learning_platform.functions.getEnrollmentDate(course_id, student_address).call()
         enrollment_date_formatted = datetime.utcfromtimestamp(enrollment_date_timestamp).strftime('%Y-%m-%d')
         completion_date_formatted = datetime.now().strftime('%Y-%m-%d')
-        instructor_address = learning_platform.functions.courses(course_id).call()[2]
         exam_result = learning_platform.functions.examResults(course_id, student_address).call()
         is_passed = exam_result[2]
         exam_status = "Passed" if is_passed else "Failed"
@@ -284,7 +407,7 @@ def instructor_panel(user_address):
 
         # Marking complete & issuing certificate - Incremental progress
         tx_hash = learning_platform.functions.markCompletionAndIssueCertificate(
-            course_id, student_address, student_name, metadata_ipfs_hash
+            course_id, student_address, cid_to_bytes32(metadata_ipfs_hash)
         ).transact({'from': user_address})
         progress_bar.progress(100)
         st.success(f"Completion Marked and Certificate Issued! Transaction Hash: {tx_hash.hex()}")
@@ -295,25 +418,21 @@ def instructor_panel(user_address):
     student_address_to_view = st.text_input('Enter Student Address to View Exam Results')
 
     # Find the corresponding course ID for the selected course name
-    course_id_to_view = None
-    for i in range(course_count):
-        course = learning_platform.functions.courses(i).call()
-        if course[1] == course_name_to_view:
-            course_id_to_view = i
-            break
+    course_to_view = catalog.course_by_title(course_name_to_view)
+    course_id_to_view = course_to_view.id if course_to_view else None
 
     # Ensure the student address is in the correct format
     if student_address_to_view:
         student_address_to_view = Web3.toChecksumAddress(student_address_to_view)
 
     # Retrieve the instructor's address for the selected course ID
-    instructor_address = learning_platform.functions.courses(course_id_to_view).call()[2]  # Instructor address is at index 2
+    instructor_address = course_to_view.instructor if course_to_view else None
 
     if user_address == instructor_address or user_address == learning_platform.functions.owner().call():
         if student_address_to_view and course_id_to_view is not None:  # Check if the student address is provided
             # Check if the student is enrolled in the course
-            enrollments = learning_platform.functions.getEnrollments(student_address_to_view).call()
-            is_enrolled = any(enrollment[0] == course_id_to_view for enrollment in enrollments)
+            enrollments = catalog.refresh_enrollments(learning_platform, student_address_to_view)
+            is_enrolled = course_id_to_view in enrollments
 
             if is_enrolled:
                 exam_result = learning_platform.functions.examResults(course_id_to_view, student_address_to_view).call()
@@ -334,12 +453,11 @@ def student_panel(user_address):
     # Initialise session state if not already initialised
     if 'taking_exam' not in session_state:
         session_state.taking_exam = {}
-        session_state.enrolled_courses = []  # Tracking enrolled courses
 
     st.title('Student Portal')
 
     # Retrieve available courses
-    course_count = learning_platform.functions.courseCount().call()
+    course_count = len(catalog.courses)
 
     # Check if there are any courses available
     if course_count == 0:
@@ -347,9 +465,8 @@ def student_panel(user_address):
         return  # Exit the function since no courses are available
     
     course_options = []
-    for i in range(course_count):
-        course = learning_platform.functions.courses(i).call()
-        course_options.append((course[0], course[1], course[3], Web3.fromWei(course[7], 'ether')))  # Storing course ID, title, IPFS hash, and fee in ether
+    for course in catalog.courses:
+        course_options.append((course.id, course.title, course.ipfs_hash, Web3.fromWei(course.fee, 'ether')))  # Storing course ID, title, IPFS hash, and fee in ether
 
     # Dropdown to select a course, including the fee in the display
     selected_course = st.selectbox('Select a Course', course_options, format_func=lambda x: f"{x[1]} (Fee: {x[3]} ETH)")
@@ -365,20 +482,17 @@ def student_panel(user_address):
     # Check if the "Enroll" button is clicked and the student name is not empty
     if st.button('Enroll'):
         if student_name:  # Check if the student name is not empty
-            # Check if the student is already enrolled in the selected course
-            if selected_course_id not in session_state.enrolled_courses:
-                selected_course_fee_in_wei = Web3.toWei(selected_course_fee, 'ether')  # Convert the fee to wei
-                
-                # Check if the student's balance is greater than or equal to the course fee
-                student_balance = w3.eth.getBalance(user_address)
-                if student_balance >= selected_course_fee_in_wei:
-                    tx_hash = learning_platform.functions.enrollInCourse(selected_course_id, student_name).transact({'from': user_address, 'value': selected_course_fee_in_wei})
-                    st.success(f"Enrolled in {selected_course_title} Successfully! Transaction Hash: {tx_hash.hex()}")
-                    session_state.enrolled_courses.append(selected_course_id)  # Add to enrolled courses
-                else:
-                    st.error("You have insufficient funds to enroll in this course.")
+            selected_course_fee_in_wei = Web3.toWei(selected_course_fee, 'ether')  # Convert the fee to wei
+
+            # Check on-chain enrollment, course state, balance and gas in one batched request, then simulate the enrollment
+            preflight = preflight_enrollment(learning_platform, user_address, selected_course_id, student_name, selected_course_fee_in_wei)
+            if preflight.ok:
+                tx_hash = learning_platform.functions.enrollInCourse(selected_course_id, student_name).transact({'from': user_address, 'value': selected_course_fee_in_wei, 'gas': preflight.gas, 'gasPrice': preflight.gas_price})
+                st.success(f"Enrolled in {selected_course_title} Successfully! Transaction Hash: {tx_hash.hex()}")
+            elif preflight.is_enrolled:
+                st.warning(preflight.error)  # Display a warning if already enrolled
             else:
-                st.warning("You are already enrolled in this course.")  # Display a warning if already enrolled
+                st.error(preflight.error)
         else:
             st.error("Please enter your name before enrolling.")  # Display an error message if the name is not entered
 
@@ -386,8 +500,9 @@ def student_panel(user_address):
     if session_state.download_clicked and not student_name:
         st.warning("Please Enter Your Name to Download Your Certificate")
 
-    # Check if the student is enrolled in the selected course
-    if selected_course_id in session_state.enrolled_courses:
+    # Check if the student is enrolled in the selected course, reading their enrollments from the chain
+    catalog.refresh_enrollments(learning_platform, user_address)
+    if catalog.enrollment(user_address, selected_course_id) is not None:
         # Check if the student has already passed the exam
         quiz_result = learning_platform.functions.examResults(selected_course_id, user_address).call()
         is_passed = quiz_result[2]
@@ -420,7 +535,7 @@ def student_panel(user_address):
                 enrollment_date_timestamp = learning_platform.functions.getEnrollmentDate(selected_course_id, user_address).call()
                 enrollment_date_formatted = datetime.utcfromtimestamp(enrollment_date_timestamp).strftime('%Y-%m-%d')
                 completion_date_formatted = datetime.now().strftime('%Y-%m-%d')
-                instructor_address = learning_platform.functions.courses(selected_course_id).call()[2]
+                instructor_address = catalog.course(selected_course_id).instructor
         
                 metadata = create_metadata(
                     certificate_id=str(selected_course_id),
@@ -439,7 +554,7 @@ def student_panel(user_address):
                 metadata_ipfs_hash = pin_to_ipfs(metadata_file)['IpfsHash']
 
                 tx_hash = learning_platform.functions.markCompletionAndIssueCertificate(
-                    selected_course_id, user_address, student_name, metadata_ipfs_hash
+                    selected_course_id, user_address, cid_to_bytes32(metadata_ipfs_hash)
                 ).transact({'from': user_address})
                 # Embed autoplaying audio using HTML
                 audio_file_url = "https://ipfs.io/ipfs/QmazrLqVKC1MAwyMjnrvL5YuRL8h4U5H1ZRhc4SpSyP85w?filename=interloodle.mp3"
@@ -457,13 +572,13 @@ def student_panel(user_address):
     for i in range(token_count):
         token_id = learning_platform.functions.tokenOfOwnerByIndex(user_address, i).call()
         certificate_ipfs_hash, _, completion_date = learning_platform.functions.getCertificate(token_id).call()
+        certificate_ipfs_hash = bytes32_to_cid(certificate_ipfs_hash)
         # Convert the completion_date (timestamp) to a human-readable date format
         completion_date_formatted = datetime.utcfromtimestamp(completion_date).strftime('%Y-%m-%d')
     
         # Fetch the course details
-        course_id = token_id 
-        course_details = learning_platform.functions.courses(course_id).call()
-        course_title = course_details[1] 
+        course = catalog.course_for_certificate(learning_platform, user_address, certificate_ipfs_hash, completion_date)
+        course_title = course.title if course else "Unknown Course"
 
         certificates.append((course_title, certificate_ipfs_hash, completion_date_formatted))
 
@@ -518,7 +633,6 @@ def main():
     # Add a logout button to the sidebar
     if st.sidebar.button('Logout'):
         # Clear the session state related to the logged-in user
-        st.session_state.enrolled_courses = []
         st.session_state.taking_exam = {}
         st.session_state.logged_in = False # Set the logged_in state to False
         st.experimental_rerun() # Rerun the app to refresh the page